@@ -1,9 +1,12 @@
 import streamlit as st
+import atexit
 import os
+import shutil
+import tempfile
+import zlib
 import json # Ensure json is imported for error handling
 from dotenv import load_dotenv
-from google import genai
-from core.analysis_engine import process_video_insights, CommunicationAnalysis # Ensure this import is correct
+from core.analysis_engine import missing_binaries, process_video_insights, probe_video_metadata, CommunicationAnalysis # Ensure this import is correct
 
 # --- Configuration & Initialization ---
 
@@ -11,22 +14,39 @@ from core.analysis_engine import process_video_insights, CommunicationAnalysis #
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-# Check for API Key and initialize client
-if GEMINI_API_KEY:
-    try:
-        # Ensure the client is only initialized once
-        @st.cache_resource
-        def get_gemini_client():
-            return genai.Client(api_key=GEMINI_API_KEY)
-        
-        gemini_client = get_gemini_client()
-        st.session_state['client_ready'] = True
-    except Exception as e:
-        st.error(f"Failed to initialize Gemini Client: {e}")
-        st.session_state['client_ready'] = False
-else:
-    st.session_state['client_ready'] = False
+# Check for API Key. The client (and the google-genai SDK behind it) is created
+# lazily on the first analysis, so sessions that never analyze never import it.
+st.session_state['client_ready'] = bool(GEMINI_API_KEY)
+
+
+# Ensure the client is only initialized once
+@st.cache_resource
+def get_gemini_client():
+    from google import genai
+    return genai.Client(api_key=GEMINI_API_KEY)
+
+
+# Cache finished analyses per URL for a day so repeat clicks skip extraction and Gemini entirely.
+# The client itself is a shared resource (see get_gemini_client), so only the URL forms the key.
+# The leading underscore keeps the session's scratch directory out of the cache key.
+@st.cache_data(ttl=24 * 60 * 60, show_spinner=False)
+def cached_analyze(video_url: str, _workdir: str) -> dict:
+    return process_video_insights(video_url=video_url, client=get_gemini_client(), workdir=_workdir).model_dump()
+
+
+# Metadata is cheap to fetch but still a network round-trip; an hour is plenty for a session.
+@st.cache_data(ttl=60 * 60, show_spinner=False)
+def cached_probe(video_url: str) -> dict:
+    return probe_video_metadata(video_url)
     
+# Transcripts are kept zlib-compressed in session state; level 6 is the speed/ratio sweet spot
+TRANSCRIPT_COMPRESSION_LEVEL = 6
+
+# One scratch directory per browser session, reused by every analysis in it
+if "workdir" not in st.session_state:
+    st.session_state.workdir = tempfile.mkdtemp(prefix="via_")
+    atexit.register(shutil.rmtree, st.session_state.workdir, ignore_errors=True)
+
 # --- Streamlit UI Components ---
 
 st.set_page_config(
@@ -57,8 +77,13 @@ if not st.session_state.get('client_ready'):
     st.error("🚨 **Configuration Error!** Please ensure you have set the `GEMINI_API_KEY` in your `.env` file and restarted the application.")
     st.stop()
 
+# 2. System Dependency Check (probed once per process, no subprocess involved)
+if missing_binaries():
+    st.error(f"🚨 **Configuration Error!** The following system utilities were not found in your PATH: `{'`, `'.join(missing_binaries())}`. Please install them and restart the application.")
+    st.stop()
+
 
-# 2. User Input Section
+# 3. User Input Section
 st.subheader("🔗 1. Video Input")
 video_url = st.text_input(
     "Paste Public Video URL (YouTube, Loom, etc.)",
@@ -67,62 +92,51 @@ video_url = st.text_input(
     label_visibility="collapsed"
 )
 
-# 3. Processing Logic
+force_reanalyze = st.checkbox(
+    "Force re-analyze",
+    value=False,
+    help="Ignore any cached result for this URL and run the full analysis again."
+)
+
+# 4. Processing Logic
 if st.button("Analyze Video Insights", type="primary", use_container_width=True) and video_url:
     
     if not video_url.startswith(("http://", "https://")):
         st.error("Please enter a valid URL starting with http:// or https://")
         st.stop()
+
+    # Drop the previous result so a failed run never shows stale insights
+    st.session_state.pop('last_analysis', None)
         
     try:
+        # Fail fast on private, live, age-restricted, or overlong videos before any heavy work
+        metadata = cached_probe(video_url)
+        if metadata["duration"]:
+            minutes, seconds = divmod(metadata["duration"], 60)
+            st.info(f"**{metadata['title']}** · {minutes}:{seconds:02d} · analyzed in {metadata['chunk_count']} chunk(s)")
+        else:
+            st.info(f"**{metadata['title']}** · unknown length")
+
         # Use st.spinner for a clean, non-intrusive loading indicator
         with st.spinner("Processing large video file... This may take a minute due to audio chunking and analysis."):
             
+            if force_reanalyze:
+                cached_analyze.clear(video_url, st.session_state.workdir)
+
             # The main backend call (handles extraction, chunking, transcription, and final analysis)
-            analysis: CommunicationAnalysis = process_video_insights(
-                video_url=video_url, 
-                client=gemini_client
+            analysis: CommunicationAnalysis = CommunicationAnalysis.model_validate(
+                cached_analyze(video_url, st.session_state.workdir)
             )
 
-        # 4. Display Outputs (Professional Results Card)
-        
+        # Keep the result for later reruns; the transcript is stored compressed and only
+        # decompressed when the user actually asks to see it.
+        st.session_state['last_analysis'] = {
+            'clarity_score': analysis.clarity_score,
+            'communication_focus': analysis.communication_focus,
+            'transcript_compressed': zlib.compress(analysis.transcript.encode("utf-8"), TRANSCRIPT_COMPRESSION_LEVEL),
+        }
         st.success("Analysis Complete! Insights Extracted:")
-        st.subheader("✨ 2. Communication Insights")
-        
-        # --- Display Metrics using Columns ---
-        col_focus, col_score = st.columns([3, 1])
-
-        with col_focus:
-            st.markdown("##### 🎯 Main Communication Focus")
-            st.markdown(f"> **{analysis.communication_focus}**")
-            
-        with col_score:
-            # Use st.metric for the core quantitative output
-            st.metric(
-                label="Clarity Score (0-100%)", 
-                value=f"{analysis.clarity_score}%",
-                delta="Key metric for fluency and structure.",
-                delta_color="off"
-            )
 
-        st.markdown("---")
-
-        # --- Display Full Transcript (Required for context/validation) ---
-        st.subheader("📜 Full Transcript & Data Validation")
-        st.markdown("The following text was generated via audio chunking and used for the final LLM analysis.")
-        
-        # --- MODIFIED SECTION FOR SCROLLING ---
-        with st.expander("Expand to View Transcript", expanded=False):
-            # Apply custom CSS to a div wrapper to enforce vertical scrolling (max height 400px)
-            st.markdown(
-                f"""
-                <div style="height: 400px; overflow-y: scroll; border: 1px solid #444; padding: 10px; border-radius: 5px; background-color: #0E1117;">
-                    <pre style="white-space: pre-wrap; font-family: monospace;">{analysis.transcript}</pre>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
-            
     except ConnectionError as e:
         st.error(f"**API Error:** {e}")
         st.markdown("The Gemini service is unavailable or the request timed out. Please wait a moment and try again.")
@@ -133,6 +147,45 @@ if st.button("Analyze Video Insights", type="primary", use_container_width=True)
         st.exception(e)
         st.error(f"An unexpected error occurred: {e}")
 
+# 5. Display Outputs (Professional Results Card)
+if 'last_analysis' in st.session_state:
+    result = st.session_state['last_analysis']
+
+    st.subheader("✨ 2. Communication Insights")
+    
+    # --- Display Metrics using Columns ---
+    col_focus, col_score = st.columns([3, 1])
+
+    with col_focus:
+        st.markdown("##### 🎯 Main Communication Focus")
+        st.markdown(f"> **{result['communication_focus']}**")
+        
+    with col_score:
+        # Use st.metric for the core quantitative output
+        st.metric(
+            label="Clarity Score (0-100%)", 
+            value=f"{result['clarity_score']}%",
+            delta="Key metric for fluency and structure.",
+            delta_color="off"
+        )
+
+    st.markdown("---")
+
+    # --- Display Full Transcript (Required for context/validation) ---
+    st.subheader("📜 Full Transcript & Data Validation")
+    st.markdown("The following text was generated via audio chunking and used for the final LLM analysis.")
+    
+    # A toggle (unlike an expander, whose body always runs) skips decompression while hidden
+    if st.toggle("Show Full Transcript", value=False):
+        # A read-only text area scrolls natively and renders the text as-is (no HTML injection)
+        st.text_area(
+            "Transcript",
+            zlib.decompress(result['transcript_compressed']).decode("utf-8"),
+            height=400,
+            disabled=True,
+            label_visibility="collapsed"
+        )
+
 # Footer for context
 st.markdown("---")
-st.caption("Backend built with Python, `yt-dlp`, `pydub`, and Google Gemini API.")
\ No newline at end of file
+st.caption("Backend built with Python, `yt-dlp`, `PyAV`, and Google Gemini API.")
\ No newline at end of file
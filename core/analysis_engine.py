@@ -1,159 +1,669 @@
+from __future__ import annotations
+
+import functools
+import glob
 import os
+import random
+import shutil
 import tempfile
-import json
 import subprocess
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from typing import TYPE_CHECKING, BinaryIO, Optional
 
 # Third-party libraries
-from google import genai
-from google.genai import types
+# yt_dlp and google.genai are imported lazily where they are used: the app only
+# needs them on the analysis path, not when the script is first loaded.
 from pydantic import BaseModel, Field
 
+if TYPE_CHECKING:
+    from google import genai
+
+# Local modules
+from core.rate_limiter import TokenBucket
+
+# --- Gemini Quotas (proactive pacing, see TokenBucket) ---
+# Defaults match the gemini-2.5-flash free tier; raise them for paid projects.
+GEMINI_MODEL = 'gemini-2.5-flash'
+GEMINI_REQUESTS_PER_MINUTE = 10
+GEMINI_TOKENS_PER_MINUTE = 250_000
+GEMINI_UPLOADS_PER_SECOND = 1
+
+# Gemini bills audio at a flat 32 tokens per second of duration, regardless of
+# how well the audio compresses, so estimates are based on duration, not bytes.
+AUDIO_TOKENS_PER_SECOND = 32
+TARGET_SAMPLE_RATE = 16_000
+
+_generate_requests = TokenBucket(GEMINI_REQUESTS_PER_MINUTE, period=60)
+_generate_tokens = TokenBucket(GEMINI_TOKENS_PER_MINUTE, period=60)
+_file_uploads = TokenBucket(GEMINI_UPLOADS_PER_SECOND, period=1)
+
+# Deleting uploaded files is housekeeping, so it runs off the request path.
+# Gemini expires uploads after 48 hours anyway, which bounds any missed delete.
+_file_cleanup = ThreadPoolExecutor(max_workers=2, thread_name_prefix="gemini-gc")
+
+# --- Retry Policy (fallback when the server still rejects a paced request) ---
+# Full jitter: sleep a random time in [0, min(cap, 2**attempt)] so concurrent
+# sessions spread out instead of retrying in lockstep.
+GEMINI_MAX_RETRIES = 5
+GEMINI_MAX_BACKOFF_SECONDS = 64
+RETRYABLE_STATUS_CODES = (429, 500, 503)
+
+# --- Chunked Transcription ---
+# ~5-minute chunks keep each call well inside the model's context while
+# localizing failures; three in flight stays friendly to per-minute quotas.
+CHUNK_SECONDS = 300
+MAX_CONCURRENT_CHUNKS = 3
+# Rough English average, used only for rate-limiting the text-only pass.
+CHARS_PER_TEXT_TOKEN = 4
+# Gemini caps a whole request at 20 MB. Inline audio travels base64-encoded in
+# the JSON body (4 bytes per 3), so a chunk goes inline (no Files API round-trips)
+# only if its encoded size plus room for the prompt fits; larger ones use files.upload.
+GEMINI_REQUEST_MAX_BYTES = 20 * 1000 * 1000
+INLINE_REQUEST_OVERHEAD_BYTES = 64 * 1024
+
+# --- Input Limits ---
+# Longest video accepted for analysis; longer inputs are rejected before any download.
+MAX_VIDEO_SECONDS = 2 * 60 * 60
+
+# --- Extraction Memory Bounds ---
+# Extracted audio stays in RAM up to this size and spills to disk beyond it,
+# so peak memory no longer grows with the length of the source video.
+AUDIO_SPOOL_MAX_BYTES = 64 * 1024 * 1024
+# Spooled audio is streamed to FFmpeg in fixed-size blocks rather than in one go.
+AUDIO_COPY_BLOCK_BYTES = 512 * 1024
+
 # --- Pydantic Schema for Structured Output (ENSURES RELIABILITY) ---
 # This class defines the exact JSON structure the LLM MUST return.
-class CommunicationAnalysis(BaseModel):
-    """Defines the structured output for the communication analysis."""
+class CommunicationMetrics(BaseModel):
+    """Defines the structured output for the transcript-level analysis pass."""
     clarity_score: int = Field(..., ge=0, le=100, description="A numerical score (0-100) indicating the speaker's fluency, grammar, and pace.")
     communication_focus: str = Field(..., description="A single, concise sentence summarizing the main topic of the video.")
+
+
+class CommunicationAnalysis(CommunicationMetrics):
+    """Defines the structured output for the communication analysis."""
     transcript: str = Field(..., description="The complete text transcription of the audio content.")
 
 
 # --- 1. Audio Extraction Utility ---
 
+# External executables the pipeline spawns: yt-dlp downloads, ffmpeg splits chunks
+REQUIRED_BINARIES = ("yt-dlp", "ffmpeg")
+
+# Audio-only formats only (never a muxed video fallback), preferring webm.
+# The download is decoded straight from a pipe, which cannot seek: WebM and
+# fragmented MP4 (e.g. YouTube's DASH m4a) stream fine, but a plain m4a/mp4 with
+# its index ("moov") at the end cannot be demuxed and fails with "Invalid data".
+# Such sources are only picked when a site offers no other audio-only format.
+AUDIO_FORMAT = "bestaudio[ext=webm]/bestaudio"
+# YouTube manifests and subtitle variants we never use; skipping them saves extractor round-trips.
+# Audio-only formats come from the player response, so they remain available.
+YOUTUBE_SKIPPED_MANIFESTS = ("dash", "hls", "translated_subs")
+
+
+@functools.lru_cache(maxsize=1)
+def missing_binaries() -> tuple[str, ...]:
+    """
+    Returns the required executables that are not on PATH. Resolved with
+    shutil.which (a PATH lookup, no process spawn) and memoized per process.
+    """
+    return tuple(name for name in REQUIRED_BINARIES if shutil.which(name) is None)
+
+
+def _new_metadata_ydl():
+    """
+    Imports yt-dlp on first use and returns a new metadata-only YoutubeDL.
+    A fresh instance per probe keeps concurrent sessions from queueing
+    behind each other's network round-trips (YoutubeDL is not thread-safe).
+
+    Pip-installed yt-dlp ships lazy extractors, which only load the site
+    extractor matching a URL. Do not set YTDLP_NO_LAZY_EXTRACTORS: any
+    non-empty value (including "0") makes yt-dlp import all of them eagerly.
+    """
+    import yt_dlp
+
+    ydl_opts = {
+        "quiet": True,
+        "no_warnings": True,
+        "skip_download": True,
+        # A watch URL carrying &list=... should mean that one video, not the whole playlist;
+        # bare playlist URLs are listed without resolving their entries, then rejected.
+        "noplaylist": True,
+        "extract_flat": "in_playlist",
+        "format": AUDIO_FORMAT,
+        "extractor_args": {"youtube": {"skip": list(YOUTUBE_SKIPPED_MANIFESTS)}},
+    }
+    return yt_dlp.YoutubeDL(ydl_opts)
+
+
+def probe_video_metadata(video_url: str) -> dict:
+    """
+    Fetches a video's metadata with yt-dlp (no media download) and rejects
+    inputs that cannot or should not be analyzed, so they fail in about a
+    second instead of after a full extraction.
+
+    Args:
+        video_url (str): The public URL of the video (YouTube, Loom, etc.).
+
+    Returns:
+        dict: The video's title, duration in seconds, and planned chunk count.
+            Duration and chunk count are None when the source does not report
+            a length; such videos are allowed through unchecked.
+
+    Raises:
+        ValueError: If the URL is a playlist, or the video is unavailable, live,
+            age-restricted, or too long.
+    """
+    ydl = _new_metadata_ydl()
+    from yt_dlp.utils import DownloadError
+
+    try:
+        with ydl:
+            info = ydl.extract_info(video_url, download=False)
+    except DownloadError as e:
+        print(f"Metadata probe failed: {e}")
+        raise ValueError(f"Could not read video metadata. Check if the URL is valid and public. Detail: {e}") from e
+
+    if info.get("_type") == "playlist":
+        raise ValueError("Playlists cannot be analyzed. Please paste the URL of a single video.")
+    if info.get("is_live"):
+        raise ValueError("Live streams cannot be analyzed. Please wait until the stream has ended.")
+    if (info.get("age_limit") or 0) > 0:
+        raise ValueError("Age-restricted videos cannot be analyzed.")
+
+    # Many generic/direct-media extractors report no length; those skip the size check and chunk plan
+    duration = int(info.get("duration") or 0) or None
+    if duration and duration > MAX_VIDEO_SECONDS:
+        raise ValueError(
+            f"Video is too long ({duration // 60} min). The maximum supported length is {MAX_VIDEO_SECONDS // 60} min."
+        )
+
+    return {
+        "title": info.get("title") or video_url,
+        "duration": duration,
+        "chunk_count": -(-duration // CHUNK_SECONDS) if duration else None,
+    }
+
+
+def _transcode_to_flac(source: BinaryIO, destination: BinaryIO) -> None:
+    """
+    Decodes the first audio stream of `source` in-process with PyAV (FFmpeg's
+    libraries), resamples it to 16 kHz mono and encodes FLAC into `destination`.
+    Frames are processed as they arrive, so a pipe can be read while it is
+    still being written.
+
+    Raises:
+        ValueError: If the source cannot be decoded.
+    """
+    import av
+
+    try:
+        with av.open(source, mode="r") as input_container:
+            if not input_container.streams.audio:
+                raise ValueError("The downloaded media contains no audio stream.")
+            input_stream = input_container.streams.audio[0]
+            resampler = av.AudioResampler(format="s16", layout="mono", rate=TARGET_SAMPLE_RATE)
+
+            with av.open(destination, mode="w", format="flac") as output_container:
+                output_stream = output_container.add_stream("flac", rate=TARGET_SAMPLE_RATE)
+                output_stream.codec_context.layout = "mono"
+                output_stream.codec_context.format = "s16"
+
+                for frame in input_container.decode(input_stream):
+                    for resampled in resampler.resample(frame):
+                        output_container.mux(output_stream.encode(resampled))
+
+                # Flush the resampler, then the encoder
+                for resampled in resampler.resample(None):
+                    output_container.mux(output_stream.encode(resampled))
+                output_container.mux(output_stream.encode(None))
+    except av.error.FFmpegError as e:
+        raise ValueError(f"Could not decode the downloaded audio. Detail: {e}") from e
+
+
 @contextmanager
-def extract_audio_from_url(video_url: str):
+def extract_audio_from_url(video_url: str, workdir: Optional[str] = None):
     """
-    Uses yt-dlp to extract the audio from a video URL and saves it to a
-    temporary MP3 file. The file is automatically cleaned up on exit.
+    Streams the best audio-only stream of a video URL out of yt-dlp and
+    transcodes it in-process to 16 kHz mono FLAC while the download is still
+    in progress. The yt-dlp process is torn down automatically on exit.
 
     Args:
         video_url (str): The public URL of the video (YouTube, Loom, etc.).
+        workdir (str, optional): Directory the audio spills into once it outgrows
+            memory. Defaults to the system temp directory.
 
     Yields:
-        str: The path to the temporary MP3 file.
+        BinaryIO: A spooled temporary file holding the FLAC-encoded audio,
+            rewound to the start. It lives in memory until it outgrows
+            AUDIO_SPOOL_MAX_BYTES, then transparently moves to disk.
     """
-    # Create a temporary file path
-    temp_dir = tempfile.mkdtemp()
-    temp_file_path = os.path.join(temp_dir, "audio.mp3")
-
-    # yt-dlp command to extract audio and convert to mp3
-    # Note: This requires the external 'ffmpeg' and 'ffprobe' utilities to be installed.
-    command = [
+    # yt-dlp command to fetch the audio-only stream as-is and write it to stdout.
+    # Fragmented (DASH/HLS) sources are fetched in parallel to keep the pipe fed.
+    download_command = [
         "yt-dlp",
-        "-x",  # Extract audio
-        "--audio-format", "mp3",
-        "--output", temp_file_path,
+        "--format", AUDIO_FORMAT,
+        "--extractor-args", f"youtube:skip={','.join(YOUTUBE_SKIPPED_MANIFESTS)}",
+        "--concurrent-fragments", "16",
+        "--no-playlist",
+        "--quiet",
+        "--no-progress",
+        "--output", "-",
         video_url
     ]
 
+    missing = missing_binaries()
+    if missing:
+        raise ValueError(f"Required system utilities are missing from PATH: {', '.join(missing)}.")
+
+    downloader = None
+    # yt-dlp's stderr goes to a temp file so it can never fill a pipe and stall the download
+    download_log = tempfile.TemporaryFile()
+    audio_file = tempfile.SpooledTemporaryFile(max_size=AUDIO_SPOOL_MAX_BYTES, dir=workdir)
+
     try:
-        # Run the command
-        subprocess.run(
-            command,
-            check=True,
-            capture_output=True,
-            text=True
+        downloader = subprocess.Popen(
+            download_command,
+            stdout=subprocess.PIPE,
+            stderr=download_log
         )
-        if not os.path.exists(temp_file_path):
-             raise FileNotFoundError(f"yt-dlp ran successfully but failed to create the expected file at {temp_file_path}.")
 
-        yield temp_file_path
+        # Decode yt-dlp's stdout as it arrives so network and CPU work overlap.
+        # Speech needs nothing more than 16 kHz mono, and FLAC is far cheaper to encode than MP3.
+        transcode_error = None
+        try:
+            _transcode_to_flac(downloader.stdout, audio_file)
+        except ValueError as e:
+            transcode_error = e
+        # Close our end of the pipe so yt-dlp gets SIGPIPE if decoding stopped early
+        downloader.stdout.close()
+        downloader.wait()
+
+        # A failed download also starves the decoder, so report yt-dlp's error first
+        if downloader.returncode != 0:
+            download_log.seek(0)
+            raise subprocess.CalledProcessError(downloader.returncode, download_command, stderr=download_log.read())
+        if transcode_error:
+            raise transcode_error
+        if audio_file.tell() == 0:
+            raise FileNotFoundError("yt-dlp ran successfully but produced no audio data.")
+
+        audio_file.seek(0)
+        yield audio_file
 
     except subprocess.CalledProcessError as e:
-        error_message = f"Audio extraction failed. Please ensure 'ffmpeg' and 'ffprobe' are installed and in your system PATH. Detail: {e.stderr}"
+        stderr = e.stderr.decode(errors="replace") if isinstance(e.stderr, bytes) else e.stderr
+        error_message = f"Audio extraction failed. Detail: {stderr}"
         print(f"Subprocess error: {error_message}")
         raise ValueError(f"Could not extract audio from URL. Check if the URL is valid and public. Detail: {error_message.strip()}") from e
     except Exception as e:
         print(f"An unexpected error occurred during audio extraction: {e}")
         raise
     finally:
-        # Cleanup the temporary directory and its contents
-        if os.path.exists(temp_dir):
-            import shutil
-            shutil.rmtree(temp_dir)
+        # Make sure yt-dlp never outlives the request
+        if downloader and downloader.poll() is None:
+            downloader.kill()
+            downloader.wait()
+        download_log.close()
+        audio_file.close()
             
 # --- 2. Multimodal Analysis (Gemini) ---
 
-def analyze_audio_file(
-    audio_path: str, 
-    client: genai.Client
-) -> CommunicationAnalysis:
+def estimate_audio_tokens(duration_seconds: float) -> int:
+    """
+    Estimates the Gemini input tokens for audio of the given duration.
+    """
+    return int(duration_seconds * AUDIO_TOKENS_PER_SECOND) + 1
+
+
+def _fits_inline(num_bytes: int) -> bool:
+    """Whether audio of this size, once base64-encoded, fits in a single request."""
+    encoded_size = 4 * -(-num_bytes // 3)
+    return encoded_size + INLINE_REQUEST_OVERHEAD_BYTES <= GEMINI_REQUEST_MAX_BYTES
+
+
+def flac_duration_seconds(path: str) -> Optional[float]:
     """
-    Uploads the audio file to Gemini, requests transcription and analysis,
-    and returns the structured results.
+    Reads a FLAC file's duration from its STREAMINFO header (no decoding).
+    Returns None if the header is unreadable or does not record the total
+    sample count.
+    """
+    with open(path, "rb") as f:
+        header = f.read(42)
+    # "fLaC" marker, 4-byte block header, then STREAMINFO; bytes 10-17 of STREAMINFO
+    # pack sample rate (20 bits), channels (3), bits per sample (5), total samples (36)
+    if len(header) < 42 or header[:4] != b"fLaC" or header[4] & 0x7F != 0:
+        return None
+    packed = int.from_bytes(header[18:26], "big")
+    sample_rate = packed >> 44
+    total_samples = packed & ((1 << 36) - 1)
+    if not sample_rate or not total_samples:
+        return None
+    return total_samples / sample_rate
+
+
+def chunk_duration_seconds(chunk_path: str, segment_seconds: int = CHUNK_SECONDS) -> float:
+    """
+    Returns an upper bound on the duration of a chunk written by split_audio.
+
+    Stream-copied segments inherit the source file's STREAMINFO, so their
+    header reports the length of the whole recording. It is only trusted
+    when shorter than the segment length (i.e. the source was one chunk).
+    """
+    header_seconds = flac_duration_seconds(chunk_path)
+    if header_seconds is None:
+        return float(segment_seconds)
+    return min(header_seconds, float(segment_seconds))
+
+
+def _wait_for_generate_quota(estimated_tokens: int) -> None:
+    """Blocks until both the request and token buckets allow another call."""
+    waited = _generate_requests.acquire()
+    waited += _generate_tokens.acquire(estimated_tokens)
+    if waited:
+        print(f"Rate limiter delayed Gemini request by {waited:.1f}s")
+
+
+def _retry_after_seconds(error: genai.errors.APIError) -> float:
+    """Returns the server's Retry-After hint in seconds, or 0 if absent or not numeric."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After", 0))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _generate_with_retry(client: genai.Client, estimated_tokens: int, **request):
+    """
+    Calls client.models.generate_content once the rate limiter allows it,
+    retrying rate-limit and transient server errors with jittered backoff.
+
+    Args:
+        client (genai.Client): Initialized Gemini client instance.
+        estimated_tokens (int): Input tokens the request is expected to consume.
+        **request: Keyword arguments forwarded to generate_content.
+
+    Returns:
+        The generate_content response.
+
+    Raises:
+        ConnectionError: If the server asks to wait longer than GEMINI_MAX_BACKOFF_SECONDS.
+    """
+    from google.genai import errors
+
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        _wait_for_generate_quota(estimated_tokens)
+        try:
+            return client.models.generate_content(**request)
+        except errors.APIError as e:
+            if e.code not in RETRYABLE_STATUS_CODES or attempt == GEMINI_MAX_RETRIES:
+                raise
+            retry_after = _retry_after_seconds(e)
+            # Don't park the request thread on an unusually long server-requested wait
+            if retry_after > GEMINI_MAX_BACKOFF_SECONDS:
+                raise ConnectionError(
+                    f"Gemini is rate limiting requests (HTTP {e.code}). Please try again in about {retry_after:.0f} seconds."
+                ) from e
+            wait_time = random.uniform(0, min(GEMINI_MAX_BACKOFF_SECONDS, 2 ** attempt))
+            wait_time = max(wait_time, retry_after)
+            print(f"Gemini returned {e.code}; retrying in {wait_time:.1f}s (attempt {attempt + 1}/{GEMINI_MAX_RETRIES})")
+            time.sleep(wait_time)
+
+
+def audio_size(audio: BinaryIO) -> int:
+    """
+    Returns the size in bytes of a seekable audio file object without
+    reading it, leaving the read position unchanged.
+    """
+    position = audio.tell()
+    size = audio.seek(0, os.SEEK_END)
+    audio.seek(position)
+    return size
+
+
+def split_audio(
+    audio: BinaryIO,
+    output_dir: str,
+    chunk_prefix: str = "chunk_",
+    segment_seconds: int = CHUNK_SECONDS
+) -> list[str]:
+    """
+    Splits FLAC audio into fixed-length chunk files using FFmpeg's segment
+    muxer. Streams are copied, not re-encoded, so this is nearly free.
 
     Args:
-        audio_path (str): Path to the local audio file.
+        audio (BinaryIO): FLAC audio produced by extract_audio_from_url.
+        output_dir (str): Directory to write the chunk files into.
+        chunk_prefix (str): File name prefix; keeps concurrent runs sharing a directory apart.
+        segment_seconds (int): Target length of each chunk in seconds.
+
+    Returns:
+        list[str]: Chunk file paths in playback order.
+    """
+    command = [
+        "ffmpeg",
+        "-loglevel", "error",
+        "-f", "flac",
+        "-i", "pipe:0",
+        "-f", "segment",
+        "-segment_time", str(segment_seconds),
+        "-reset_timestamps", "1",
+        "-c", "copy",
+        os.path.join(output_dir, f"{chunk_prefix}%03d.flac")
+    ]
+
+    # Feed the audio through stdin block by block; a spooled file may have no real fd to hand over
+    with tempfile.TemporaryFile() as split_log:
+        splitter = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=split_log)
+        try:
+            audio.seek(0)
+            shutil.copyfileobj(audio, splitter.stdin, AUDIO_COPY_BLOCK_BYTES)
+            splitter.stdin.close()
+        except BrokenPipeError:
+            # FFmpeg exited early; its return code and log below explain why
+            pass
+        splitter.wait()
+
+        if splitter.returncode != 0:
+            split_log.seek(0)
+            error_message = split_log.read().decode(errors="replace").strip()
+            print(f"Subprocess error: {error_message}")
+            raise ValueError(f"Could not split the extracted audio into chunks. Detail: {error_message}")
+
+    chunk_paths = sorted(glob.glob(os.path.join(output_dir, f"{glob.escape(chunk_prefix)}*.flac")))
+    if not chunk_paths:
+        raise ValueError("FFmpeg produced no audio chunks. The extracted audio may be empty.")
+    return chunk_paths
+
+
+def transcribe_chunk(chunk_path: str, client: genai.Client) -> str:
+    """
+    Sends a single audio chunk to Gemini and returns its verbatim transcript.
+    Small chunks are sent inline with the prompt; larger ones are uploaded.
+
+    Args:
+        chunk_path (str): Path to the local FLAC chunk.
         client (genai.Client): Initialized Gemini client instance.
 
     Returns:
-        CommunicationAnalysis: The Pydantic object containing the score and focus.
+        str: The plain-text transcript of the chunk.
     """
-    print(f"Starting Gemini analysis for: {audio_path}")
+    from google.genai import types
+
+    chunk_size = os.path.getsize(chunk_path)
     uploaded_file = None
     try:
-        # 1. Upload the audio file using the Files API
-        # This is necessary for larger files, but good practice regardless.
-        uploaded_file = client.files.upload(file=audio_path)
-        print(f"File uploaded to Gemini: {uploaded_file.name} ({uploaded_file.mime_type})")
-
-        # 2. Define the LLM instructions and structured output format
-        system_instruction = (
-            "You are a Senior Communication Analyst. Your task is to transcribe "
-            "the provided audio file and generate a professional communication analysis. "
-            "You MUST strictly follow the provided JSON schema for the output. "
-            "The Clarity Score should reflect the speaker's fluency, coherence, and grammar, "
-            "and the Communication Focus must be a single, concise, professional sentence."
+        # 1. Attach the chunk inline when it fits, otherwise upload it via the Files API
+        if _fits_inline(chunk_size):
+            with open(chunk_path, "rb") as f:
+                audio_part = types.Part.from_bytes(data=f.read(), mime_type="audio/flac")
+        else:
+            # files.upload already uses Gemini's resumable protocol, streaming the file from disk
+            # in sequential 8 MiB parts. That protocol has no parallel parts, so upload
+            # concurrency comes from the chunk workers, each sending its own file.
+            _file_uploads.acquire()
+            uploaded_file = client.files.upload(
+                file=chunk_path,
+                config=types.UploadFileConfig(
+                    mime_type="audio/flac",
+                    display_name=os.path.basename(chunk_path)
+                )
+            )
+            print(f"Chunk uploaded to Gemini: {uploaded_file.name} ({os.path.basename(chunk_path)})")
+            audio_part = uploaded_file
+
+        prompt = (
+            "Transcribe the provided audio verbatim. Return only the transcript text, "
+            "with no commentary, headings, or timestamps."
         )
 
-        prompt = "Analyze the provided audio. Generate the full, accurate transcript, calculate the Clarity Score (0-100), and state the Communication Focus."
-
-        # 3. Call the model with structured output
-        response = client.models.generate_content(
-            model='gemini-2.5-flash',
-            contents=[prompt, uploaded_file],
-            config=types.GenerateContentConfig(
-                system_instruction=system_instruction,
-                response_mime_type="application/json",
-                response_schema=CommunicationAnalysis,
-                temperature=0.0,
-            )
+        # 2. Request a plain-text transcript (paced and retried by the helper)
+        response = _generate_with_retry(
+            client,
+            estimate_audio_tokens(chunk_duration_seconds(chunk_path)),
+            model=GEMINI_MODEL,
+            contents=[prompt, audio_part],
+            config=types.GenerateContentConfig(temperature=0.0)
         )
+        return (response.text or "").strip()
 
-        # 4. Parse the structured JSON response
-        # The response text will be a JSON string conforming to the Pydantic model
-        json_string = response.text
-        
-        # 5. Validate and return the Pydantic object
-        analysis_data = json.loads(json_string)
-        return CommunicationAnalysis.model_validate(analysis_data)
+    finally:
+        # 3. Clean up the uploaded chunk from the Gemini service in the background
+        if uploaded_file:
+            print(f"Scheduling deletion of uploaded file: {uploaded_file.name}")
+            _file_cleanup.submit(_delete_uploaded_file, client, uploaded_file.name)
+
+
+def _delete_uploaded_file(client: genai.Client, name: str) -> None:
+    """Deletes an uploaded file from the Gemini service, logging instead of raising."""
+    try:
+        client.files.delete(name=name)
+        print(f"Deleted uploaded file: {name}")
+    except Exception as e:
+        print(f"Failed to delete uploaded file {name}: {e}")
+
+
+def analyze_transcript(transcript: str, client: genai.Client) -> CommunicationMetrics:
+    """
+    Runs a text-only Gemini pass over the stitched transcript to compute the
+    Clarity Score and Communication Focus.
+
+    Args:
+        transcript (str): The full transcript of the video.
+        client (genai.Client): Initialized Gemini client instance.
+
+    Returns:
+        CommunicationMetrics: The Pydantic object containing the score and focus.
+    """
+    from google.genai import types
+
+    # 1. Define the LLM instructions and structured output format
+    system_instruction = (
+        "You are a Senior Communication Analyst. Your task is to read the provided "
+        "transcript and generate a professional communication analysis. "
+        "You MUST strictly follow the provided JSON schema for the output. "
+        "The Clarity Score should reflect the speaker's fluency, coherence, and grammar, "
+        "and the Communication Focus must be a single, concise, professional sentence."
+    )
+
+    prompt = f"Analyze the following transcript. Calculate the Clarity Score (0-100) and state the Communication Focus.\n\n{transcript}"
+
+    # 2. Call the model with structured output (paced and retried by the helper)
+    response = _generate_with_retry(
+        client,
+        len(prompt) // CHARS_PER_TEXT_TOKEN,
+        model=GEMINI_MODEL,
+        contents=prompt,
+        config=types.GenerateContentConfig(
+            system_instruction=system_instruction,
+            response_mime_type="application/json",
+            response_schema=CommunicationMetrics,
+            temperature=0.0,
+        )
+    )
 
-    except genai.errors.APIError as e:
+    # 3. Use the SDK's schema-parsed result; fall back to validating whatever it produced
+    parsed = response.parsed
+    if isinstance(parsed, CommunicationMetrics):
+        return parsed
+    if parsed is not None:
+        return CommunicationMetrics.model_validate(parsed)
+    # The SDK leaves `parsed` empty if it could not decode the reply; validate the raw JSON for a clear error
+    return CommunicationMetrics.model_validate_json(response.text)
+
+
+def analyze_audio_file(
+    audio: BinaryIO, 
+    client: genai.Client,
+    workdir: Optional[str] = None
+) -> CommunicationAnalysis:
+    """
+    Splits the audio into chunks, transcribes them concurrently with Gemini,
+    then analyzes the stitched transcript and returns the structured results.
+
+    Args:
+        audio (BinaryIO): FLAC audio produced by extract_audio_from_url.
+        client (genai.Client): Initialized Gemini client instance.
+        workdir (str, optional): Existing directory for the chunk files. Defaults to
+            the system temp directory. Only this run's chunks are removed afterwards.
+
+    Returns:
+        CommunicationAnalysis: The Pydantic object containing the score, focus, and transcript.
+    """
+    from google.genai import errors
+
+    print(f"Starting Gemini analysis for {audio_size(audio)} bytes of audio")
+    chunk_dir = workdir or tempfile.gettempdir()
+    chunk_prefix = f"chunk_{uuid.uuid4().hex}_"
+    try:
+        # 1. Split into fixed-length chunks without re-encoding
+        chunk_paths = split_audio(audio, chunk_dir, chunk_prefix)
+        print(f"Audio split into {len(chunk_paths)} chunk(s) of up to {CHUNK_SECONDS}s")
+
+        # 2. Transcribe chunks with bounded concurrency; map() preserves chunk order
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CHUNKS) as executor:
+            chunk_transcripts = list(executor.map(lambda path: transcribe_chunk(path, client), chunk_paths))
+
+        transcript = "\n\n".join(text for text in chunk_transcripts if text)
+
+        # 3. Score the stitched transcript in a single cheap text-only pass
+        metrics = analyze_transcript(transcript, client)
+        return CommunicationAnalysis(transcript=transcript, **metrics.model_dump())
+
+    except errors.APIError as e:
         print(f"Gemini API Error: {e}")
         raise ConnectionError(f"Gemini API call failed. Check your API Key and usage limits. Detail: {e}") from e
     except Exception as e:
         print(f"An unexpected error occurred during analysis: {e}")
         raise
     finally:
-        # 5. Clean up the uploaded file from the Gemini service
-        if uploaded_file:
-            print(f"Deleting uploaded file: {uploaded_file.name}")
-            client.files.delete(name=uploaded_file.name)
+        # Remove only this run's chunks; the directory itself may be reused by later runs
+        for chunk_path in glob.glob(os.path.join(chunk_dir, f"{glob.escape(chunk_prefix)}*")):
+            os.remove(chunk_path)
             
 
 # --- 3. Main Orchestration Function ---
 
-def process_video_insights(video_url: str, client: genai.Client) -> CommunicationAnalysis:
+def process_video_insights(
+    video_url: str,
+    client: genai.Client,
+    workdir: Optional[str] = None
+) -> CommunicationAnalysis:
     """
     Orchestrates the entire process: extract audio, analyze, and return results.
+    Pass a long-lived `workdir` to reuse one scratch directory across runs.
     """
     print(f"Starting process for URL: {video_url}")
     
     # Context manager handles temporary file creation and cleanup automatically
-    with extract_audio_from_url(video_url) as audio_path:
-        print(f"Audio successfully extracted to: {audio_path}")
+    with extract_audio_from_url(video_url, workdir) as audio:
+        print(f"Audio successfully extracted: {audio_size(audio)} bytes of FLAC")
         
-        # Pass the path to the analysis function
-        analysis_result = analyze_audio_file(audio_path, client)
+        # Pass the spooled audio file to the analysis function
+        analysis_result = analyze_audio_file(audio, client, workdir)
         
         return analysis_result
\ No newline at end of file
@@ -0,0 +1,56 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket used to pace outgoing API calls below a quota
+    instead of waiting for the server to reject them.
+
+    The bucket starts full and refills continuously at `capacity / period`
+    tokens per second, so short bursts are allowed while the long-run rate
+    never exceeds `capacity` tokens per `period` seconds.
+    """
+
+    def __init__(self, capacity: float, period: float):
+        """
+        Args:
+            capacity (float): Maximum tokens available per period (e.g. requests per minute).
+            period (float): Length of the quota window in seconds.
+        """
+        self.capacity = float(capacity)
+        self.refill_rate = self.capacity / period
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.refill_rate)
+        self._last_refill = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """
+        Blocks until `tokens` are available, then consumes them.
+
+        Requests larger than the bucket are clamped to its capacity so they
+        wait for a full window rather than blocking forever.
+
+        Args:
+            tokens (float): Number of tokens this call costs.
+
+        Returns:
+            float: Total seconds spent waiting.
+        """
+        tokens = min(float(tokens), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                wait_time = (tokens - self._tokens) / self.refill_rate
+            time.sleep(wait_time)
+            waited += wait_time
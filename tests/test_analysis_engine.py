@@ -0,0 +1,187 @@
+import os
+import shutil
+from types import SimpleNamespace
+
+import pytest
+
+from core import analysis_engine
+from core.analysis_engine import (
+    AUDIO_TOKENS_PER_SECOND,
+    GEMINI_REQUEST_MAX_BYTES,
+    MAX_VIDEO_SECONDS,
+    _fits_inline,
+    _retry_after_seconds,
+    chunk_duration_seconds,
+    estimate_audio_tokens,
+    flac_duration_seconds,
+    probe_video_metadata,
+    split_audio,
+)
+
+
+def _write_silent_flac(path: str, seconds: int, sample_rate: int = 16000) -> None:
+    """Writes `seconds` of 16 kHz mono silence as FLAC using PyAV."""
+    av = pytest.importorskip("av")
+    samples_per_frame = sample_rate // 10
+    with av.open(path, mode="w", format="flac") as container:
+        stream = container.add_stream("flac", rate=sample_rate)
+        stream.codec_context.layout = "mono"
+        stream.codec_context.format = "s16"
+        for index in range(seconds * 10):
+            frame = av.AudioFrame(format="s16", layout="mono", samples=samples_per_frame)
+            frame.sample_rate = sample_rate
+            frame.planes[0].update(bytes(2 * samples_per_frame))
+            frame.pts = index * samples_per_frame
+            container.mux(stream.encode(frame))
+        container.mux(stream.encode(None))
+
+
+# --- Token estimates ---
+
+def test_estimate_audio_tokens_scales_with_duration():
+    assert estimate_audio_tokens(300) >= 300 * AUDIO_TOKENS_PER_SECOND
+    assert estimate_audio_tokens(0) > 0
+
+
+def test_flac_duration_reads_streaminfo(tmp_path):
+    path = str(tmp_path / "audio.flac")
+    _write_silent_flac(path, seconds=3)
+
+    assert flac_duration_seconds(path) == pytest.approx(3.0)
+
+
+def test_flac_duration_is_none_for_non_flac(tmp_path):
+    path = tmp_path / "not_flac.bin"
+    path.write_bytes(b"ID3" + bytes(64))
+
+    assert flac_duration_seconds(str(path)) is None
+    assert chunk_duration_seconds(str(path), segment_seconds=5) == 5.0
+
+
+def test_chunk_duration_is_bounded_by_segment_length(tmp_path):
+    av = pytest.importorskip("av")
+    source = str(tmp_path / "source.flac")
+    _write_silent_flac(source, seconds=20)
+
+    # Stream-copy into 5 s segments, as split_audio does, to reproduce the inherited header
+    with av.open(source) as input_container, av.open(
+        str(tmp_path / "chunk_%03d.flac"),
+        mode="w",
+        format="segment",
+        options={"segment_time": "5", "segment_format": "flac", "reset_timestamps": "1"},
+    ) as output_container:
+        input_stream = input_container.streams.audio[0]
+        output_stream = output_container.add_stream_from_template(input_stream)
+        for packet in input_container.demux(input_stream):
+            if packet.dts is None:
+                continue
+            packet.stream = output_stream
+            output_container.mux(packet)
+
+    chunks = sorted(str(path) for path in tmp_path.glob("chunk_*.flac"))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk_duration_seconds(chunk, segment_seconds=5) <= 5.0
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="requires the ffmpeg binary")
+def test_split_audio_chunk_estimates_cover_one_segment(tmp_path):
+    source = str(tmp_path / "source.flac")
+    _write_silent_flac(source, seconds=20)
+
+    with open(source, "rb") as audio:
+        chunks = split_audio(audio, str(tmp_path), "chunk_test_", segment_seconds=5)
+
+    assert len(chunks) == 4
+    assert all(os.path.basename(chunk).startswith("chunk_test_") for chunk in chunks)
+    for chunk in chunks:
+        tokens = estimate_audio_tokens(chunk_duration_seconds(chunk, segment_seconds=5))
+        assert tokens <= estimate_audio_tokens(5)
+
+
+# --- Inline payload sizing ---
+
+def test_fits_inline_accounts_for_base64_growth():
+    # 15 MB raw is 20 MB once base64-encoded, which leaves no room for the prompt
+    assert _fits_inline(14_000_000)
+    assert not _fits_inline(15_000_000)
+    assert not _fits_inline(GEMINI_REQUEST_MAX_BYTES)
+
+
+# --- Retry-After parsing ---
+
+def _api_error(headers):
+    return SimpleNamespace(code=429, response=SimpleNamespace(headers=headers))
+
+
+def test_retry_after_reads_numeric_header():
+    assert _retry_after_seconds(_api_error({"Retry-After": "7"})) == 7.0
+
+
+@pytest.mark.parametrize("headers", [{}, None, {"Retry-After": "Wed, 21 Oct 2026 07:28:00 GMT"}])
+def test_retry_after_defaults_to_zero(headers):
+    assert _retry_after_seconds(_api_error(headers)) == 0.0
+
+
+def test_retry_after_without_response():
+    assert _retry_after_seconds(SimpleNamespace(code=503)) == 0.0
+
+
+# --- Metadata probe ---
+
+class _FakeYoutubeDL:
+    def __init__(self, info):
+        self.info = info
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def extract_info(self, url, download):
+        assert download is False
+        return self.info
+
+
+@pytest.fixture
+def probe_with(monkeypatch):
+    """Returns a function that runs probe_video_metadata against canned yt-dlp info."""
+    pytest.importorskip("yt_dlp")
+
+    def probe(info):
+        monkeypatch.setattr(analysis_engine, "_new_metadata_ydl", lambda: _FakeYoutubeDL(info))
+        return probe_video_metadata("https://example.com/video")
+
+    return probe
+
+
+def test_probe_plans_chunks_from_duration(probe_with):
+    metadata = probe_with({"title": "Talk", "duration": 601.5})
+
+    assert metadata == {"title": "Talk", "duration": 601, "chunk_count": 3}
+
+
+def test_probe_uses_a_fresh_youtubedl_per_call():
+    pytest.importorskip("yt_dlp")
+    first, second = analysis_engine._new_metadata_ydl(), analysis_engine._new_metadata_ydl()
+
+    assert first is not second
+
+
+def test_probe_allows_unknown_duration(probe_with):
+    metadata = probe_with({"title": "Direct media"})
+
+    assert metadata["duration"] is None
+    assert metadata["chunk_count"] is None
+
+
+@pytest.mark.parametrize("info", [
+    {"_type": "playlist", "entries": []},
+    {"is_live": True, "duration": 60},
+    {"age_limit": 18, "duration": 60},
+    {"duration": MAX_VIDEO_SECONDS + 1},
+])
+def test_probe_rejects_unsupported_videos(probe_with, info):
+    with pytest.raises(ValueError):
+        probe_with(info)
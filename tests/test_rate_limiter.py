@@ -0,0 +1,29 @@
+import time
+
+from core.rate_limiter import TokenBucket
+
+
+def test_burst_up_to_capacity_does_not_wait():
+    bucket = TokenBucket(3, period=60)
+    assert [bucket.acquire() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+def test_acquire_waits_for_refill_once_empty():
+    bucket = TokenBucket(2, period=0.2)
+    bucket.acquire(2)
+
+    start = time.monotonic()
+    waited = bucket.acquire()
+
+    assert waited > 0
+    assert time.monotonic() - start >= 0.09
+
+
+def test_oversized_request_is_clamped_to_capacity():
+    bucket = TokenBucket(2, period=0.2)
+
+    start = time.monotonic()
+    bucket.acquire(2)
+    bucket.acquire(1000)  # would block forever without clamping
+
+    assert time.monotonic() - start < 1